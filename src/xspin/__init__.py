@@ -1,30 +1,52 @@
-from math import ceil
 import sys
+from os import write as fdwrite
 from typing import (
     Any,
     Callable,
     Concatenate,
     Coroutine,
     Iterable,
+    Iterator,
     Optional,
     ParamSpec,
     Self,
     TypeVar,
 )
 from unicodedata import category, combining, east_asian_width
-from threading import Thread
-from time import sleep
-from asyncio import create_task, sleep as asleep, CancelledError, run as arun
-from functools import wraps
+from threading import Event, Thread, current_thread
+from time import monotonic
+from asyncio import (
+    create_task,
+    sleep as asleep,
+    get_running_loop,
+    CancelledError,
+    run as arun,
+)
+from collections import deque
+from functools import lru_cache, wraps
+from re import compile
 from types import MethodType
+from warnings import warn
 
 if sys.platform == "win32":
-    from ctypes import byref, c_ulong, windll, Structure
-    from ctypes.wintypes import SHORT, USHORT
+    from ctypes import byref, windll, Structure, POINTER
+    from ctypes.wintypes import BOOL, DWORD, HANDLE, SHORT, USHORT
 
+    # Explicit signatures so ctypes doesn't guess the argument
+    # conversions on each call (and keeps 64 bit handles intact).
     KERNEL32 = windll.KERNEL32
-    OUTHANDLE = KERNEL32.GetStdHandle(-12)  # Stderr handle
-    GetConsoleScreenBuffer = KERNEL32.GetConsoleScreenBufferInfo
+    GetStdHandle = KERNEL32.GetStdHandle
+    GetStdHandle.argtypes = [DWORD]
+    GetStdHandle.restype = HANDLE
+    GetConsoleMode = KERNEL32.GetConsoleMode
+    GetConsoleMode.argtypes = [HANDLE, POINTER(DWORD)]
+    GetConsoleMode.restype = BOOL
+    SetConsoleMode = KERNEL32.SetConsoleMode
+    SetConsoleMode.argtypes = [HANDLE, DWORD]
+    SetConsoleMode.restype = BOOL
+
+    OUTHANDLE = GetStdHandle(-12)  # Stderr handle
+    MODE = DWORD()
 
     def _():
         """
@@ -32,12 +54,9 @@ if sys.platform == "win32":
         so ansi escape codes are parsed.
         """
         VT_PROCESSING_MODE = 0x0004
-        GetConsoleMode = KERNEL32.GetConsoleMode
-        SetConsoleMode = KERNEL32.SetConsoleMode
-        mode = c_ulong()
-        GetConsoleMode(OUTHANDLE, byref(mode))
-        mode.value |= VT_PROCESSING_MODE
-        SetConsoleMode(OUTHANDLE, mode)
+        GetConsoleMode(OUTHANDLE, byref(MODE))
+        MODE.value |= VT_PROCESSING_MODE
+        SetConsoleMode(OUTHANDLE, MODE)
 
     _()
 
@@ -49,12 +68,12 @@ if sys.platform == "win32":
 
         @staticmethod
         def before():
-            state.stream.write("\x1b]9;4;3;0\a")
+            state.buffer += b"\x1b]9;4;3;0\a"
             hide_cursor()
 
         @staticmethod
         def after():
-            state.stream.write("\x1b]9;4;0;0\a")
+            state.buffer += b"\x1b]9;4;0;0\a"
             show_cursor()
 
     class _COORD(Structure):
@@ -77,20 +96,46 @@ if sys.platform == "win32":
             ("d", _COORD),  # dwMaximumWindowSize
         ]
 
+    GetConsoleScreenBuffer = KERNEL32.GetConsoleScreenBufferInfo
+    GetConsoleScreenBuffer.argtypes = [HANDLE, POINTER(_ConsoleScreenBuffer)]
+    GetConsoleScreenBuffer.restype = BOOL
     CSBI = _ConsoleScreenBuffer()
 
+    class console:
+        """
+        Windows has no resize signal so the console width
+        is only queried again after `ttl` seconds.
+        """
+
+        ttl = 0.5
+        width = 80
+        checked = -ttl
+
     def get_console_width() -> int:
-        if not GetConsoleScreenBuffer(byref(CSBI)):
-            return 80
-        return CSBI.win.right - CSBI.win.left + 1
+        now = monotonic()
+        if now - console.checked < console.ttl:
+            return console.width
+        console.checked = now
+        if not GetConsoleScreenBuffer(OUTHANDLE, byref(CSBI)):
+            console.width = 80
+        else:
+            console.width = CSBI.win.right - CSBI.win.left + 1
+        return console.width
+
+    def get_fd(stream: Any) -> Optional[int]:
+        """
+        The console decodes raw writes with its own code page,
+        so output always goes through the stream on windows.
+        """
+        return None
 
 else:
     import termios
-    from sys import stdin
     from fcntl import ioctl
+    from signal import getsignal, signal, SIGWINCH, SIG_DFL
     from struct import unpack
 
-    FD = stdin.fileno()
+    FD = sys.stdin.fileno()
 
     class schedule:
         """
@@ -105,105 +150,323 @@ else:
             new_settings = termios.tcgetattr(FD)
             new_settings[3] = new_settings[3] & ~termios.ECHO
             termios.tcsetattr(FD, termios.TCSADRAIN, new_settings)
+            console.watch()
             hide_cursor()
 
         @classmethod
         def after(cls):
             termios.tcsetattr(FD, termios.TCSADRAIN, cls.old_settings)
+            console.unwatch()
             show_cursor()
 
+    class console:
+        """
+        While a spinner runs, the console width is cached
+        until the terminal is resized (SIGWINCH).
+        """
+
+        width = 0
+        watching = False
+        previous: Any = None
+
+        @classmethod
+        def resized(cls, signum: int, frame: Any):
+            cls.width = 0
+            if callable(cls.previous):
+                cls.previous(signum, frame)
+
+        @classmethod
+        def watch(cls):
+            try:
+                cls.previous = signal(SIGWINCH, cls.resized)
+                cls.watching = True
+            except ValueError:  # Not started from the main thread
+                pass
+
+        @classmethod
+        def unwatch(cls):
+            cls.width = 0
+            if not cls.watching:
+                return
+            cls.watching = False
+            if getsignal(SIGWINCH) != cls.resized:
+                return  # Replaced by the application, leave it be
+            try:
+                signal(SIGWINCH, SIG_DFL if cls.previous is None else cls.previous)
+            except ValueError:  # Not stopped from the main thread
+                pass
+
     def get_console_width() -> int:
+        # The cache can't be trusted once another handler replaces ours.
+        if console.width and getsignal(SIGWINCH) == console.resized:
+            return console.width
         try:
-            rows, *_ = unpack("HHHH", ioctl(FD, termios.TIOCGWINSZ, "1234"))
-            return rows
+            _, columns, *_ = unpack("HHHH", ioctl(FD, termios.TIOCGWINSZ, bytes(8)))
         except Exception:
             return 80
+        columns = columns or 80
+        if console.watching:
+            console.width = columns
+        return columns
+
+    def get_fd(stream: Any) -> Optional[int]:
+        try:
+            return stream.fileno()
+        except Exception:
+            return None
 
 
 def hide_cursor():
-    stream = state.stream
-    stream.write("\x1b[?25l")
-    stream.flush()
+    state.buffer += b"\x1b[?25l"
 
 
 def show_cursor():
-    stream = state.stream
-    stream.write("\x1b[?25h")
-    stream.flush()
+    state.buffer += b"\x1b[?25h"
 
 
 class state:
     stream = sys.stdout.isatty() and sys.stdout or sys.stderr
     enabled = stream.isatty()
-    handle: Any = None
+    task: Any = None  # Worker thread or asyncio task running the spinner
     instance: Any = None
+    buffer = bytearray()
+    fd = get_fd(stream)
+    encoding = getattr(stream, "encoding", None) or "utf-8"
+    errors = getattr(stream, "errors", None) or "strict"
+
+
+def write(text: str):
+    """
+    Queues text to be written to the stream on the next `flush`
+    so each spinner frame goes out in a single write.
+    Only meant to be called from `render`; use `echo` otherwise.
+    """
+    state.buffer += text.encode(state.encoding, state.errors)
+
+
+def flush():
+    """
+    Writes the queued output straight to the stream's file descriptor
+    when it has one, skipping the text layer for the escape codes.
+    """
+    buffer = state.buffer
+    stream = state.stream
+    fd = state.fd
+    if fd is None:
+        stream.write(buffer.decode(state.encoding, state.errors))
+        stream.flush()
+        buffer.clear()
+        return
+    stream.flush()
+    while buffer:
+        del buffer[: fdwrite(fd, buffer)]
 
 
-pattern = None
-
-
-def get_pattern():
-    global pattern
-    if pattern:
-        return pattern
-    from re import compile
-
-    pattern = compile("\x1b" r"[^m]*?m")
-    return pattern
+ANSI_SUB = compile(r"\x1b\[[^m]*m").sub
 
 
-def chwidth(char: str) -> int:
-    if category(char) in ["Cc", "Cf"]:
+def chwidth(
+    char: str,
+    category: Callable[[str], str] = category,
+    combining: Callable[[str], int] = combining,
+    east_asian_width: Callable[[str], str] = east_asian_width,
+) -> int:
+    kind = category(char)
+    if kind == "Cc" or kind == "Cf":
         return -1
     if combining(char):
         return 0
     width = east_asian_width(char)
-    if width in ["W", "F"]:
+    if width == "W" or width == "F":
         return 2
     return 1
 
 
+class Widths(dict[str, int]):
+    """
+    Character widths, computed on first lookup
+    so measuring text never leaves the dict after warm up.
+    """
+
+    def __missing__(self, char: str) -> int:
+        width = self[char] = chwidth(char)
+        return width
+
+
+widths = Widths((chr(i), 1) for i in range(0x20, 0x7F))
+
+
 def mchwidth(text: str):
-    return sum(map(chwidth, text))
+    return sum(map(widths.__getitem__, text))
 
 
-def get_lines(text: str) -> Iterable[int]:
-    console_width = get_console_width()
-    text = get_pattern().sub("", text)
-    length = text.isascii() and len or mchwidth
+@lru_cache(maxsize=128)
+def get_lines(text: str, console_width: int) -> int:
+    """
+    Lines taken up by `text` in the console. Cached since spinners
+    keep cycling through the same frames.
+    """
+    text = ANSI_SUB("", text)
+    lines = 0
 
     for line in text.splitlines():
-        yield ceil(length(line) / console_width) or 1
+        width = len(line) if line.isascii() else mchwidth(line)
+        lines += -(-width // console_width) or 1
+    return lines
 
 
-def clear_lines(lines: int):
-    write = state.stream.write
-    write("\x1b[1G")
-    for i in range(lines):
-        if i > 0:
-            write("\x1b[1A")
-        write("\x1b[2K\x1b[1G")
+CLEAR_LINE = b"\x1b[2K\x1b[1G"
+CLEAR_LINE_UP = b"\x1b[1A" + CLEAR_LINE
 
 
-def live_text(frames: Iterable[str]):
-    write = state.stream.write
-    flush = state.stream.flush
+@lru_cache(maxsize=32)
+def clear_lines(lines: int) -> bytes:
+    if lines > 0:
+        return CLEAR_LINE + CLEAR_LINE_UP * (lines - 1)
+    return b""
+
+
+def live_text(frames: Iterable[str]) -> Iterator[int]:
     for frame in frames:
         write(frame)
-        flush()
-        yield get_lines(frame)
+        yield get_lines(frame, get_console_width())
+
+
+class worker:
+    """
+    Daemon thread shared by all sync spinners. It is started
+    on first use and waits for the next spinner when idle.
+    """
+
+    handle: Optional[Thread] = None
+    pending = Event()
+    idle = Event()
+
+    @classmethod
+    def loop(cls):
+        while True:
+            cls.pending.wait()
+            cls.pending.clear()
+            try:
+                runtime = state.instance
+                if isinstance(runtime, SyncRuntime):
+                    runtime.run()
+            finally:
+                cls.idle.set()
+
+    @classmethod
+    def submit(cls) -> Thread:
+        cls.idle.clear()
+        if not (cls.handle and cls.handle.is_alive()):
+            cls.handle = Thread(target=cls.loop, daemon=True)
+            cls.handle.start()
+        cls.pending.set()
+        return cls.handle
 
 
 PS = ParamSpec("PS")
 R = TypeVar("R")
 
 
-class SyncRuntime:
+class Runtime:
+    """
+    Frame loop shared by the sync and async runtimes.
+    They only differ in how they wait for the next frame.
+    """
+
+    __slots__ = (
+        "running",
+        "delay",
+        "messages",
+        "deadline",
+        "clearable",
+        "last",
+        "direct",
+    )
 
     def __init__(self, delay: int) -> None:
         self.running = False
         self.delay = (min(0, delay) or 50) / 1000
-        self.message = ""
+        self.messages: deque[str] = deque()
+        self.deadline = 0.0
+        self.clearable = 0
+        self.last: Optional[bytearray] = None
+        self.direct = False
+
+    def render(self, message: str | None = None) -> int:
+        raise NotImplementedError()
+
+    def drain(self) -> str:
+        """
+        Takes all the queued messages. Messages queued
+        while draining are kept for the next frame.
+        """
+        messages = self.messages
+        return "".join([messages.popleft() for _ in range(len(messages))])
+
+    def tick(self) -> float:
+        """
+        Renders and writes out the next frame.
+        Returns the time left until the next one is due.
+        """
+        buffer = state.buffer
+        message = self.drain() or None
+        mark = len(buffer)
+        clearable = self.clearable
+        buffer += clear_lines(clearable)
+        # The clear is queued, so it must not be repeated if render fails.
+        self.clearable = 0
+        if self.direct:
+            # The last render wrote to the stream itself rather than
+            # through `write`, so the clear has to go out before it.
+            flush()
+        start = len(buffer)
+        lines = self.render(message)
+        if not isinstance(lines, int):
+            warn(
+                "render() should return the number of lines as an int, "
+                "returning an iterable of line counts is deprecated.",
+                DeprecationWarning,
+            )
+            lines = sum(lines)
+        frame = buffer[start:]
+        self.direct = not frame
+        if message is None and frame and frame == self.last and lines == clearable:
+            # Same output as what's on screen, skip redrawing it.
+            del buffer[mark:]
+            self.clearable = clearable
+        else:
+            self.clearable = lines
+            self.last = None if message else frame
+        flush()
+        return max(0.0, self.deadline - monotonic())
+
+    def expired(self):
+        self.deadline = max(self.deadline + self.delay, monotonic())
+
+    def clear(self):
+        state.buffer += clear_lines(self.clearable)
+        self.clearable = 0
+        self.last = None
+        self.direct = False
+
+    def finish(self, epilogue: str | None):
+        message = self.drain()
+        if epilogue:
+            message = f"{message}{epilogue}\n"
+        write(message)
+        schedule.after()
+        flush()
+        state.task = None
+        state.instance = None
+
+
+class SyncRuntime(Runtime):
+    __slots__ = ("wake",)
+
+    def __init__(self, delay: int) -> None:
+        super().__init__(delay)
+        self.wake = Event()
 
     def __enter__(self):
         self.start()
@@ -212,21 +475,18 @@ class SyncRuntime:
     def __exit__(self, *e: Any):
         return self.stop()
 
-    def render(self, message: str | None = None) -> Iterable[int]:
-        raise NotImplementedError()
-
     def run(self):
-        clearable = None
-        delay = self.delay
+        tick = self.tick
+        wake = self.wake
+        self.deadline = monotonic() + self.delay
         try:
             while self.running:
-                clearable = self.render(self.message or None)
-                self.message = ""
-                sleep(delay)
-                clear_lines(sum(clearable))
+                if not wake.wait(tick()):
+                    self.expired()
+                wake.clear()
         except Exception:
-            if clearable:
-                clear_lines(sum(clearable))
+            pass
+        self.clear()
 
     def start(self):
         if self.running or not state.enabled:
@@ -234,25 +494,21 @@ class SyncRuntime:
         if state.instance:
             stop()
         schedule.before()
+        flush()
         state.instance = self
         self.running = True
-        handle = Thread(target=self.run, daemon=True)
-        handle.start()
-        state.handle = handle
+        state.task = worker.submit()
 
     def stop(self, epilogue: str | None = None):
         if not self.running:
             return
+        if current_thread() is worker.handle:
+            raise RuntimeError("A spinner can't be stopped from its own render loop.")
         self.running = False
-        if state.handle:
-            state.handle.join()
-        message = self.message
-        if epilogue:
-            message = f"{message}{epilogue}\n"
-        state.stream.write(message)
-        schedule.after()
-        state.handle = None
-        state.instance = None
+        self.wake.set()
+        if state.task:
+            worker.idle.wait()
+        self.finish(epilogue)
 
     def bind(self, fn: Callable[Concatenate[Self, PS], R]) -> Callable[PS, R]:
         @wraps(fn)
@@ -263,13 +519,11 @@ class SyncRuntime:
         return MethodType(wrapper, self)
 
 
-class AsyncRuntime:
-    __slots__ = "running", "delay", "message"
+class AsyncRuntime(Runtime):
+    __slots__ = ()
 
     def __init__(self, delay: int) -> None:
-        self.running = False
-        self.delay = (min(0, delay) or 50) / 1000
-        self.message = ""
+        super().__init__(delay)
 
     async def __aenter__(self):
         await self.start()
@@ -278,50 +532,45 @@ class AsyncRuntime:
     async def __aexit__(self, *e: Any):
         return await self.stop()
 
-    def render(self, message: str | None = None) -> Iterable[int]:
-        raise NotImplementedError()
-
     async def run(self):
-        clearable = None
-        delay = self.delay
+        tick = self.tick
+        self.deadline = monotonic() + self.delay
         try:
             while self.running:
-                clearable = self.render(self.message or None)
-                self.message = ""
-                await asleep(delay)
-                clear_lines(sum(clearable))
+                await asleep(tick())
+                self.expired()
         except Exception:
-            if clearable:
-                clear_lines(sum(clearable))
+            pass
+        finally:
+            # Also runs when `stop` cancels the task mid sleep.
+            self.clear()
 
     async def start(self):
         if self.running or not state.enabled:
             return
-        if state.instance:
-            stop()
+        instance = state.instance
+        if isinstance(instance, AsyncRuntime):
+            await instance.stop()
+        elif instance:
+            instance.stop()
 
         schedule.before()
+        flush()
         state.instance = self
         self.running = True
-        handle = create_task(self.run())
-        state.handle = handle
+        state.task = create_task(self.run())
 
     async def stop(self, epilogue: str | None = None):
         if not self.running:
             return
         self.running = False
-        if state.handle:
+        if state.task:
+            state.task.cancel()
             try:
-                await state.handle
+                await state.task
             except CancelledError:
                 pass
-        message = self.message
-        if epilogue:
-            message = f"{message}{epilogue}\n"
-        state.stream.write(message)
-        schedule.after()
-        state.handle = None
-        state.instance = None
+        self.finish(epilogue)
 
     def bind(
         self, fn: Callable[Concatenate[Self, PS], Coroutine[Any, Any, R]]
@@ -335,10 +584,19 @@ class AsyncRuntime:
 
 
 def stop():
-    if isinstance(state.handle, SyncRuntime):
-        state.handle.stop()
-    elif isinstance(state.handle, AsyncRuntime):
-        arun(state.handle.stop())
+    instance = state.instance
+    if instance is None:
+        return
+    if not isinstance(instance, AsyncRuntime):
+        return instance.stop()
+    try:
+        get_running_loop()
+    except RuntimeError:
+        return arun(instance.stop())
+    raise RuntimeError(
+        "Async spinners should be stopped with `await spinner.stop()` "
+        "inside a running event loop."
+    )
 
 
 def force():
@@ -385,19 +643,19 @@ class Spinner:
             symbols or r"\|/-",
         )
         self.running: bool
-        self.message: str
+        self.messages: deque[str]
         self.live = iter(live_text(self.frames))
 
-    def render(self, message: str | None = None) -> Iterable[int]:
+    def render(self, message: str | None = None) -> int:
         if message:
-            state.stream.write(message)
+            write(message)
         lines = next(self.live)
         return lines
 
     def echo(self, *values: Any, sep: str = ""):
         message = sep.join(map(str, values)) + "\n"
         if self.running:
-            setattr(self, "message", self.message + message)
+            self.messages.append(message)
             return
         state.stream.write(message)
 
@@ -452,9 +710,9 @@ class CustomSpinner(SyncRuntime):
     def frames(self) -> Iterable[str]:
         raise NotImplementedError()
 
-    def render(self, message: str | None = None) -> Iterable[int]:
+    def render(self, message: str | None = None) -> int:
         if message:
-            state.stream.write(message)
+            write(message)
         return next(self.live)
 
 
@@ -466,7 +724,7 @@ class CustomAspinner(AsyncRuntime):
     def frames(self) -> Iterable[str]:
         raise NotImplementedError()
 
-    def render(self, message: str | None = None) -> Iterable[int]:
+    def render(self, message: str | None = None) -> int:
         if message:
-            state.stream.write(message)
+            write(message)
         return next(self.live)
@@ -53,7 +53,7 @@ class SyncRuntime:
     def __exit__(self, *e: object) -> None:
         pass
 
-    def render(self, message: str | None = None) -> Iterable[str]:
+    def render(self, message: str | None = None) -> int:
         """
         Defined by the subclass. It is called by the spinner's main loop
         and handles rendering the main spinner frame.
@@ -62,8 +62,7 @@ class SyncRuntime:
         * `message` Optional string. Passed down from when the echo method is called.
 
         # Returns
-        It should return an iterable of integers used to compute the lines
-        the spinner frame takes up in the console.
+        The number of lines the spinner frame takes up in the console.
 
         # Note
         The module provides base classes that remove the need to implement this method
@@ -133,7 +132,7 @@ class AsyncRuntime:
     async def __aexit__(self, *e: object) -> None:
         pass
 
-    def render(self, message: str | None = None) -> Iterable[str]:
+    def render(self, message: str | None = None) -> int:
         """
         Defined by the subclass. It is called by the spinner's main loop
         and handles rendering the main spinner frame.
@@ -142,8 +141,7 @@ class AsyncRuntime:
         * `message` Optional string. Passed down from when the echo method is called.
 
         # Returns
-        It should return an iterable of integers used to compute the lines
-        the spinner frame takes up in the console.
+        The number of lines the spinner frame takes up in the console.
 
         # Note
         The module provides base classes that remove the need to implement this method
@@ -301,7 +299,13 @@ class CustomAspinner(AsyncRuntime):
         """
 
 def stop() -> None:
-    """Stops the spinner running currently."""
+    """
+    Stops the spinner running currently.
+
+    # Raises
+    `RuntimeError` when the spinner is async and this is called
+    inside a running event loop, where it has to be awaited instead.
+    """
 
 def force() -> None:
     """